@@ -1,22 +1,209 @@
 import cv2
-import pytesseract
-import re
 import os
+import tempfile
+import threading
 
 import numpy as np
 
+try:
+    # In-process Tesseract API: the engine and language data are loaded once
+    # instead of spawning a new tesseract process for every image.
+    from tesserocr import PyTessBaseAPI, PSM
+    from PIL import Image
+
+    HAS_TESSEROCR = True
+except ImportError:
+    # Fallback: pytesseract shells out to the tesseract binary (slower)
+    import pytesseract
+
+    HAS_TESSEROCR = False
+
+try:
+    # libjpeg-turbo: decodes JPEGs straight to grayscale and at reduced scale
+    from turbojpeg import TurboJPEG, TJPF_GRAY, TJSAMP_GRAY
+
+    _tj = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    # Package or shared library missing: fall back to cv2.imdecode
+    _tj = None
+
+# OCR threads are parallelized by the caller; keep OpenCV single-threaded
+# to avoid oversubscribing the CPU.
+cv2.setNumThreads(1)
+
 # Crop Constants (Ratios relative to image size)
 CROP_HEIGHT_START = 0.70
 CROP_HEIGHT_END = 0.90
 CROP_WIDTH_START = 0.30
 CROP_WIDTH_END = 0.75
 
+# Pre-filter (checked from the file header, before decoding):
+# images smaller than this or with an implausible aspect ratio are skipped
+MIN_IMAGE_WIDTH = 400
+MIN_IMAGE_HEIGHT = 400
+MIN_ASPECT_RATIO = 0.3  # width / height
+MAX_ASPECT_RATIO = 3.0
 
-def extract_redeem_code(image_input, debug=False):
+# Crops shorter than this (pixels) are upscaled 2x before OCR
+MIN_CROP_HEIGHT = 80
+
+# Tesseract Configuration
+# PSM 6 (SINGLE_BLOCK): Assume a single uniform block of text.
+# Whitelist: Alphanumeric only (A-Z, 0-9) + common separators
+TESS_WHITELIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789: ."
+
+# Code extraction: the code is the first run of 16 characters from A-Z/0-9.
+# Any other character (spaces, ":", ".", newlines...) ends a run.
+CODE_LENGTH = 16
+_CODE_CHARS = np.zeros(256, dtype=bool)
+_CODE_CHARS[ord("A") : ord("Z") + 1] = True
+_CODE_CHARS[ord("0") : ord("9") + 1] = True
+
+# Per-thread state: a TessBaseAPI instance is not reentrant, so each OCR
+# thread gets its own (along with its own decode buffer).
+_thread_local = threading.local()
+
+
+def _get_api():
     """
-    Extracts a 16-character Google Play redeem code from an image.
-    Args:
-        image_input: Can be a file path (str) or a byte object (memory buffer).
+    Returns the tesserocr API for the calling thread, creating it on first use.
+    """
+    api = getattr(_thread_local, "api", None)
+    if api is None:
+        api = PyTessBaseAPI(psm=PSM.SINGLE_BLOCK)
+        api.SetVariable("tessedit_char_whitelist", TESS_WHITELIST)
+        _thread_local.api = api
+    return api
+
+
+def _image_to_string(img):
+    """
+    Runs Tesseract on a single-channel (binarized) image and returns the raw text.
+    """
+    if HAS_TESSEROCR:
+        # Grayscale arrays map to "L" mode images, no color conversion needed
+        pil_img = Image.fromarray(img)
+        api = _get_api()
+        api.SetImage(pil_img)
+        return api.GetUTF8Text()
+
+    custom_config = f'--psm 6 -c tessedit_char_whitelist="{TESS_WHITELIST}"'
+    return pytesseract.image_to_string(img, config=custom_config)
+
+
+# JPEG Start-Of-Frame markers (they carry the image dimensions)
+_JPEG_SOF_MARKERS = frozenset(
+    (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF)
+)
+
+
+def _peek_size(buf):
+    """
+    Reads (width, height) from a JPEG or PNG header without decoding.
+    Returns None for other formats or malformed headers.
+    """
+    if buf[:8] == b"\x89PNG\r\n\x1a\n":
+        # IHDR is always the first chunk: width/height at offsets 16 and 20
+        if len(buf) < 24:
+            return None
+        return int.from_bytes(buf[16:20], "big"), int.from_bytes(buf[20:24], "big")
+
+    if buf[:2] == b"\xff\xd8":
+        # Walk the marker segments until the SOF segment
+        i = 2
+        while i + 9 <= len(buf):
+            if buf[i] != 0xFF:
+                return None
+            marker = buf[i + 1]
+            if marker == 0xFF:
+                # Fill byte
+                i += 1
+                continue
+            if marker in _JPEG_SOF_MARKERS:
+                height = int.from_bytes(buf[i + 5 : i + 7], "big")
+                width = int.from_bytes(buf[i + 7 : i + 9], "big")
+                # A height of 0 means it's defined later in the file (DNL)
+                return (width, height) if width and height else None
+            if marker in (0xD9, 0xDA):
+                # End of image / start of scan before any frame header
+                return None
+            i += 2 + int.from_bytes(buf[i + 2 : i + 4], "big")
+
+    return None
+
+
+def _decode_jpeg_gray(buf):
+    """
+    Decodes JPEG bytes to a grayscale array using libjpeg-turbo.
+    Photos are decoded at half scale when the code region would still be at
+    least MIN_CROP_HEIGHT rows tall (so it never needs upscaling back).
+    The output buffer is reused
+    (per thread) while consecutive images have the same size.
+    Returns None if libjpeg-turbo can't decode it (e.g. CMYK JPEGs, or a
+    PyTurboJPEG version without in-place decoding).
+    """
+    try:
+        width, height, _, _ = _tj.decode_header(buf)
+        scaling_factor = None
+        half_height = (height + 1) // 2
+        if half_height * (CROP_HEIGHT_END - CROP_HEIGHT_START) >= MIN_CROP_HEIGHT:
+            scaling_factor = (1, 2)
+            width, height = (width + 1) // 2, half_height
+
+        shape = (height, width, 1)
+        dst = getattr(_thread_local, "decode_buf", None)
+        if dst is None or dst.shape != shape:
+            dst = np.empty(shape, dtype=np.uint8)
+            _thread_local.decode_buf = dst
+
+        img = _tj.decode(
+            buf, pixel_format=TJPF_GRAY, scaling_factor=scaling_factor, dst=dst
+        )
+    except (OSError, ValueError, TypeError):
+        return None
+    return img[:, :, 0]
+
+
+def _save_debug_crop(img):
+    """
+    Writes the preprocessed crop to a JPEG unique to this process/thread
+    and returns the filename. With libjpeg-turbo, encoding reuses a
+    per-thread output buffer.
+    """
+    filename = f"debug_crop_{os.getpid()}_{threading.get_ident()}.jpg"
+    if _tj is None:
+        cv2.imwrite(filename, img)
+        return filename
+
+    needed = _tj.buffer_size(img, TJSAMP_GRAY)
+    buf = getattr(_thread_local, "debug_buf", None)
+    if buf is None or len(buf) < needed:
+        buf = bytearray(needed)
+        _thread_local.debug_buf = buf
+
+    _, size = _tj.encode(
+        img,
+        quality=80,
+        pixel_format=TJPF_GRAY,
+        jpeg_subsample=TJSAMP_GRAY,
+        dst=buf,
+    )
+    with open(filename, "wb") as f:
+        f.write(memoryview(buf)[:size])
+    return filename
+
+
+# Raised when the Tesseract engine/binary is unavailable
+if HAS_TESSEROCR:
+    _TESSERACT_ERRORS = (RuntimeError,)
+else:
+    _TESSERACT_ERRORS = (pytesseract.TesseractNotFoundError,)
+
+
+def _load_crop(image_input, debug=False):
+    """
+    Loads an image and returns the binarized code region, ready for OCR.
+    Returns None if the image can't be loaded.
     """
     img = None
 
@@ -26,11 +213,28 @@ def extract_redeem_code(image_input, debug=False):
         if not os.path.exists(image_input):
             print(f"Error: File '{image_input}' not found.")
             return None
-        img = cv2.imread(image_input)
+        img = cv2.imread(image_input, cv2.IMREAD_GRAYSCALE)
     elif isinstance(image_input, bytes):
         # It's raw bytes (from Telethon download)
-        nparr = np.frombuffer(image_input, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Skip images that can't be a code card before paying for a decode
+        size = _peek_size(image_input)
+        if size is not None:
+            width, height = size
+            if (
+                width < MIN_IMAGE_WIDTH
+                or height < MIN_IMAGE_HEIGHT
+                or not MIN_ASPECT_RATIO <= width / height <= MAX_ASPECT_RATIO
+            ):
+                print(f"Skipping {width}x{height} image (unlikely to contain a code).")
+                return None
+
+        if _tj is not None and image_input[:2] == b"\xff\xd8":
+            # JPEG: fast grayscale decode
+            img = _decode_jpeg_gray(image_input)
+        if img is None:
+            # PNG/WebP, no libjpeg-turbo, or a JPEG it couldn't handle
+            nparr = np.frombuffer(image_input, np.uint8)
+            img = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
     else:
         print("Error: Invalid input type. Expected file path (str) or bytes.")
         return None
@@ -40,10 +244,8 @@ def extract_redeem_code(image_input, debug=False):
         return None
 
     # 2. Preprocessing
-    # gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
     # Crop to bottom section (Optimization: The code is usually at the bottom)
-    height, width, _ = img.shape
+    height, width = img.shape
 
     y_start = int(height * CROP_HEIGHT_START)
     y_end = int(height * CROP_HEIGHT_END)
@@ -53,45 +255,125 @@ def extract_redeem_code(image_input, debug=False):
     # image[ y_start : y_end , x_start : x_end ]
     img_cropped = img[y_start:y_end, x_start:x_end]
 
+    # Copy out just the crop and drop the full image so its memory is
+    # released before the rest of the pipeline runs
+    img_cropped = np.ascontiguousarray(img_cropped)
+    del img
+
+    # Otsu binarization: Tesseract works best on clean black/white text and
+    # skips its own thresholding pass. (Images are already decoded as grayscale.)
+    if img_cropped.shape[0] < MIN_CROP_HEIGHT:
+        img_cropped = cv2.resize(
+            img_cropped, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC
+        )
+    _, img_cropped = cv2.threshold(
+        img_cropped, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU
+    )
+
     if debug:
         # Debug: Save the cropped image
-        debug_filename = "debug_crop.jpg"
-        cv2.imwrite(debug_filename, img_cropped)
+        debug_filename = _save_debug_crop(img_cropped)
         print(f"DEBUG: Saved cropped image to '{debug_filename}'")
 
-    # 3. Tesseract Configuration
-    # --psm 6: Assume a single uniform block of text.
-    # whitelist: Alphanumeric only (A-Z, 0-9) + common separators
-    custom_config = (
-        r'--psm 6 -c tessedit_char_whitelist="ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789: ."'
-    )
+    return img_cropped
+
 
+def _parse_code(text):
+    """
+    Finds the redeem code in raw OCR text.
+    Returns it formatted as XXXX-XXXX-XXXX-XXXX, or None.
+    """
+    # Non-ASCII characters become "?" so they still separate runs
+    raw = text.encode("ascii", "replace")
+    is_code_char = _CODE_CHARS[np.frombuffer(raw, dtype=np.uint8)]
+
+    # Gaps between separators (sentinels at both ends) are run length + 1
+    bounds = np.concatenate(([-1], np.flatnonzero(~is_code_char), [len(raw)]))
+    long_runs = np.flatnonzero(np.diff(bounds) > CODE_LENGTH)
+    if long_runs.size == 0:
+        return None
+
+    # Format: XXXX-XXXX-XXXX-XXXX
+    start = bounds[long_runs[0]] + 1
+    c = raw[start : start + CODE_LENGTH].decode("ascii")
+    return f"{c[0:4]}-{c[4:8]}-{c[8:12]}-{c[12:16]}"
+
+
+def extract_redeem_code(image_input, debug=False):
+    """
+    Extracts a 16-character Google Play redeem code from an image.
+    Args:
+        image_input: Can be a file path (str) or a byte object (memory buffer).
+    """
+    img_cropped = _load_crop(image_input, debug)
+    if img_cropped is None:
+        return None
+
+    # 3. Run OCR
     try:
-        # Run OCR on color image
-        text = pytesseract.image_to_string(img_cropped, config=custom_config)
+        text = _image_to_string(img_cropped)
         if debug:
             print(f"DEBUG: Raw Text:\n{text}")
-    except pytesseract.TesseractNotFoundError:
+    except _TESSERACT_ERRORS:
         print("Error: Tesseract is not installed or not in PATH.")
         return None
 
-    # 4. Extract Code using Regex
-    # Pattern: Look for exactly 16 alphanumeric characters.
-    # We replace common noise chars with space to ensure we don't merge lines unexpectedly.
-    clean_text = text.replace(":", " ").replace(".", " ").replace("\n", " ")
-
-    # Find all sequences of 16 alphanumeric characters
-    # We don't use \b because the cleaning might leave it adjacent to spaces which is fine,
-    # but strictly checking length 16 is key.
-    candidates = re.findall(r"[A-Z0-9]{16}", clean_text)
-
-    # Filter candidates: Usually codes have a mix of letters and numbers,
-    # but strict 16 chars is the strongest signal.
-    for candidate in candidates:
-        # Format: XXXX-XXXX-XXXX-XXXX
-        formatted_code = "-".join(
-            candidate[i : i + 4] for i in range(0, len(candidate), 4)
-        )
-        return formatted_code
+    # 4. Extract Code
+    return _parse_code(text)
 
-    return None
+
+def _batch_image_to_string(crops):
+    """
+    Runs a single tesseract process over several crops using its file-list
+    mode (pytesseract fallback only). Returns one text per crop.
+    """
+    # Prefer RAM-backed storage for the temporary images
+    tmp_root = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    with tempfile.TemporaryDirectory(prefix="ocr_", dir=tmp_root) as tmp_dir:
+        paths = []
+        for i, crop in enumerate(crops):
+            path = os.path.join(tmp_dir, f"ocr_{i}.pgm")
+            cv2.imwrite(path, crop)
+            paths.append(path)
+
+        list_path = os.path.join(tmp_dir, "list.txt")
+        with open(list_path, "w") as f:
+            f.write("\n".join(paths) + "\n")
+
+        custom_config = f'--psm 6 -c tessedit_char_whitelist="{TESS_WHITELIST}"'
+        text = pytesseract.image_to_string(list_path, config=custom_config)
+
+    # Tesseract ends every page with a form feed
+    pages = text.split("\x0c")
+    return [pages[i] if i < len(pages) else "" for i in range(len(crops))]
+
+
+def extract_redeem_codes(image_inputs, debug=False):
+    """
+    Extracts redeem codes from several images at once.
+    Returns a list with a code (or None) for each input, in order.
+
+    With tesserocr the engine is already loaded once per thread, so images
+    are simply processed in turn. The pytesseract fallback instead OCRs the
+    whole batch in a single tesseract run to avoid a process start per image.
+    """
+    if HAS_TESSEROCR or len(image_inputs) < 2:
+        return [extract_redeem_code(image, debug) for image in image_inputs]
+
+    crops = [_load_crop(image, debug) for image in image_inputs]
+    valid = [i for i, crop in enumerate(crops) if crop is not None]
+    codes = [None] * len(image_inputs)
+    if not valid:
+        return codes
+
+    try:
+        texts = _batch_image_to_string([crops[i] for i in valid])
+    except _TESSERACT_ERRORS:
+        print("Error: Tesseract is not installed or not in PATH.")
+        return codes
+
+    for i, text in zip(valid, texts):
+        if debug:
+            print(f"DEBUG: Raw Text:\n{text}")
+        codes[i] = _parse_code(text)
+    return codes
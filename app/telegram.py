@@ -1,7 +1,37 @@
-from telethon import TelegramClient, events
+from telethon import TelegramClient, events, types
 import asyncio
 import time
 
+try:
+    # C implementation of Telegram's AES-IGE encryption. Telethon picks it up
+    # automatically; without it every downloaded byte is decrypted in Python.
+    import cryptg  # noqa: F401
+
+    HAS_CRYPTG = True
+except ImportError:
+    HAS_CRYPTG = False
+
+
+def _largest_photo_size(photo):
+    """
+    Returns (size, file_size) for the largest full-size variant of a photo,
+    or None if it only has thumbnails.
+    Telegram doesn't order the sizes (the tiny stripped preview is often last).
+    """
+    best = None
+    for size in photo.sizes:
+        if isinstance(size, types.PhotoSize):
+            file_size = size.size
+        elif isinstance(size, types.PhotoSizeProgressive):
+            file_size = max(size.sizes)
+        else:
+            # Stripped/cached/path thumbnails
+            continue
+        if best is None or file_size > best[1]:
+            best = (size, file_size)
+    return best
+
+
 class TelegramListener:
     def __init__(self, api_id, api_hash, session_name, image_queue, target_chats=None):
         """
@@ -10,6 +40,15 @@ class TelegramListener:
         self.client = TelegramClient(session_name, api_id, api_hash)
         self.queue = image_queue
         self.target_chats = target_chats
+        # Split once into sets for O(1) lookups (usernames compared lowercase)
+        self.target_ids = frozenset(c for c in (target_chats or []) if isinstance(c, int))
+        self.target_usernames = frozenset(
+            c.lower() for c in (target_chats or []) if isinstance(c, str)
+        )
+        self._downloads = set()  # Keep references to in-flight download tasks
+
+        if not HAS_CRYPTG:
+            print("Warning: 'cryptg' is not installed. Image downloads will be much slower (pip install cryptg).")
 
         # Register handler
         self.client.add_event_handler(self.handler, events.NewMessage)
@@ -24,29 +63,59 @@ class TelegramListener:
             return
 
         # Chat Filtering
-        chat = await event.get_chat()
         chat_id = event.chat_id
-        chat_username = chat.username if hasattr(chat, 'username') else None
-        
-        # Safe title extraction
-        chat_title = getattr(chat, 'title', 'Private Chat')
-        
-        if self.target_chats:
-            is_target = chat_id in self.target_chats
-            if not is_target and chat_username:
-                is_target = chat_username in self.target_chats
-            
-            if not is_target:
+        chat = event.chat  # Entity sent with the update, if any (no request)
+
+        if self.target_chats and chat_id not in self.target_ids:
+            # Only fetch the chat when we have to match by username
+            if not self.target_usernames:
+                return
+            chat = await event.get_chat()
+            chat_username = getattr(chat, 'username', None)
+            if not chat_username or chat_username.lower() not in self.target_usernames:
                 return
-            print(f"\n[+] QUEUED: Image from {chat_title}")
+
+        # Safe title extraction
+        if chat is not None:
+            chat_title = getattr(chat, 'title', 'Private Chat')
         else:
-            print(f"\n[+] QUEUED: Image from {chat_title}")
+            chat_title = str(chat_id)
+        print(f"\n[+] QUEUED: Image from {chat_title}")
+
+        # Download in a separate task so the handler returns right away
+        start_time = time.time()
+        task = asyncio.create_task(
+            self._download_and_queue(event, start_time, chat_id, chat_title)
+        )
+        self._downloads.add(task)
+        task.add_done_callback(self._downloads.discard)
 
-        # Download to memory immediately
+    async def _download_and_queue(self, event, start_time, chat_id, chat_title):
+        """
+        Downloads the photo to memory and puts it on the queue.
+        """
         try:
-            start_time = time.time()
-            image_bytes = await event.download_media(file=bytes)
-            
+            photo = event.photo
+            largest = _largest_photo_size(photo)
+            if largest is None:
+                image_bytes = await event.download_media(file=bytes)
+            else:
+                size, file_size = largest
+                location = types.InputPhotoFileLocation(
+                    id=photo.id,
+                    access_hash=photo.access_hash,
+                    file_reference=photo.file_reference,
+                    thumb_size=size.type,
+                )
+                # 512 KB is the largest part size Telegram allows (fewest requests)
+                image_bytes = await self.client.download_file(
+                    location,
+                    file=bytes,
+                    file_size=file_size,
+                    part_size_kb=512,
+                    dc_id=photo.dc_id,
+                )
+
             # Put data into the queue for main_worker.py to handle
             # We pass a dictionary so we can carry metadata if needed later
             await self.queue.put({
@@ -4,13 +4,72 @@ import os
 import sys
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.common.exceptions import WebDriverException
 
 # only for termux
 from selenium.webdriver.chrome.service import Service
 
+# Polls the redeem page inside the browser until the Confirm button or a known
+# status message appears, so waiting costs a single DevTools round-trip.
+# Called with the timeout in ms; resolves with a status string. On timeout the
+# final page text is classified instead. The Confirm button is tagged so
+# Selenium can click it afterwards (see CONFIRM_SELECTOR).
+# A document that was already checked reports "STALE": right after
+# Page.navigate the previous page may still be showing.
+DETECT_STATUS_JS = """
+(timeoutMs) => new Promise((done) => {
+    const deadline = Date.now() + timeoutMs;
+
+    const ERRORS = [
+        [/code didn't work|invalid code/i, "INVALID"],
+        [/already redeemed|already been used/i, "ALREADY_USED"],
+        [/verify it's you|you must sign in/i, "LOGIN_REQ"],
+    ];
+    const FINAL = [[/successfully redeemed|added to your account/i, "SUCCESS"]].concat(ERRORS);
+
+    if (window.__redeemChecked) {
+        done("STALE");
+        return;
+    }
+
+    function finish(status) {
+        window.__redeemChecked = true;
+        done(status);
+    }
+
+    function matchText(patterns) {
+        const text = document.body ? document.body.innerText : "";
+        for (const [pattern, status] of patterns) {
+            if (pattern.test(text)) return status;
+        }
+        return null;
+    }
+
+    function poll() {
+        for (const btn of document.querySelectorAll("button")) {
+            if (btn.innerText.includes("Confirm") && btn.offsetParent !== null && !btn.disabled) {
+                btn.setAttribute("data-redeem-confirm", "1");
+                finish("CONFIRM");
+                return;
+            }
+        }
+        const status = matchText(ERRORS);
+        if (status) {
+            finish(status);
+        } else if (Date.now() >= deadline) {
+            finish(matchText(FINAL) || "UNKNOWN_ERROR");
+        } else {
+            setTimeout(poll, 100);
+        }
+    }
+    poll();
+})
+"""
+CONFIRM_SELECTOR = "button[data-redeem-confirm]"
+
+# Delay (seconds) before re-checking when the new page isn't there yet
+STALE_RETRY_DELAY = 0.05
+
 
 class AutoRedeemer:
     """
@@ -22,6 +81,9 @@ class AutoRedeemer:
         timeout (int): Maximum time (seconds) to wait for the Confirm button.
     """
 
+    # Session cookies shared by all instances
+    COOKIE_FILE = "google_cookies.pkl"
+
     def __init__(
         self,
         dry_run: bool = False,
@@ -38,7 +100,7 @@ class AutoRedeemer:
             timeout (int): Wait timeout for UI elements. Defaults to 20.
             profile_path (str): Path to the Chrome user data directory. Defaults to "./chrome_profile".
         """
-        self.cookie_file = "google_cookies.pkl"
+        self.cookie_file = self.COOKIE_FILE
         self.dry_run = dry_run
         self.headless = headless
         self.timeout = timeout
@@ -62,11 +124,19 @@ class AutoRedeemer:
         """
         Cleanup: Ensure the driver is closed when the object is destroyed.
         """
-        if self.driver:
+        self.shutdown()
+
+    def shutdown(self):
+        """
+        Closes the browser. The driver is kept alive between codes, so call
+        this once the bot is no longer needed.
+        """
+        if getattr(self, "driver", None):
             try:
                 self.driver.quit()
             except Exception:
                 pass
+            self.driver = None
 
     def _get_driver(self, headless: bool) -> webdriver.Chrome:
         """
@@ -94,6 +164,12 @@ class AutoRedeemer:
         # Optimizations
         options.add_argument("--disable-gpu")
         options.add_argument("--disable-extensions")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--disable-background-networking")
+        options.add_argument("--disable-sync")
+        options.add_argument("--disable-translate")
+        options.add_argument("--metrics-recording-only")
+        options.add_argument("--blink-settings=imagesEnabled=false")
         options.add_argument("--window-size=1920,1080")
         options.add_argument(
             "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
@@ -101,14 +177,29 @@ class AutoRedeemer:
 
         options.page_load_strategy = "eager"
 
-        # Block images for faster loading
-        prefs = {"profile.managed_default_content_settings.images": 2}
+        # Block everything the redeem page doesn't need to show the Confirm button
+        # (2 = block)
+        blocked = [
+            "images",
+            "stylesheets",
+            "fonts",
+            "plugins",
+            "popups",
+            "geolocation",
+            "notifications",
+            "media_stream",
+        ]
+        prefs = {
+            f"profile.managed_default_content_settings.{name}": 2 for name in blocked
+        }
         options.add_experimental_option("prefs", prefs)
 
         # only for termux
         # service = Service(executable_path="/data/data/com.termux/files/usr/bin/chromedriver")
-        # return webdriver.Chrome(options=options,service=service)
-        return webdriver.Chrome(options=options)
+        # driver = webdriver.Chrome(options=options,service=service)
+        driver = webdriver.Chrome(options=options)
+        driver.execute_cdp_cmd("Page.enable", {})
+        return driver
 
     def _load_cookies(self) -> bool:
         """
@@ -151,22 +242,20 @@ class AutoRedeemer:
         # 1. URL Injection
         url = f"https://play.google.com/redeem?code={code}"
         try:
-            self.driver.get(url)
+            # DevTools navigation returns without waiting on Selenium's page-load strategy
+            self.driver.execute_cdp_cmd("Page.navigate", {"url": url})
         except Exception:
             pass
 
-        wait = WebDriverWait(self.driver, self.timeout)
-
         # 3. Check for Confirm Button (The Real Test)
         print("Waiting for Confirm button (Priority)...")
 
-        try:
-            # Priority: Wait explicitly for the Confirm button to be clickable
-            confirm_btn = wait.until(
-                EC.element_to_be_clickable(
-                    (By.XPATH, "//button[contains(text(), 'Confirm')]")
-                )
-            )
+        status = self._wait_for_status()
+        if status is None:
+            print("Confirm button not found within time limit.")
+            return "ERROR"
+
+        if status == "CONFIRM":
             print(">>> CONFIRM BUTTON FOUND! Code is VALID.")
 
             if self.dry_run:
@@ -174,46 +263,46 @@ class AutoRedeemer:
                 return "SUCCESS (Dry Run)"
 
             print("Redeeming...")
-            confirm_btn.click()
+            self.driver.find_element(By.CSS_SELECTOR, CONFIRM_SELECTOR).click()
             time.sleep(3)
             return "SUCCESS"
 
-        except TimeoutException:
-            print("Confirm button not found within time limit.")
-
-        # 4. If Confirm timed out, check if it was because the code is Invalid
-        try:
-            invalid_elements = self.driver.find_elements(
-                By.XPATH, '//*[contains(text(), "That code didn\'t work")]'
-            )
-            if invalid_elements:
-                print(">>> Invalid code message detected.")
-                return "INVALID"
-        except Exception:
-            pass
+        # 4. Confirm never showed up: the page told us why (or we timed out)
+        if status == "INVALID":
+            print(">>> Invalid code message detected.")
+        return status
 
-        return self._get_status_text()
-
-    def _get_status_text(self) -> str:
+    def _wait_for_status(self):
         """
-        Scans the page body text to determine the final status if specific buttons are missing.
+        Runs DETECT_STATUS_JS on the current page until it reports a status,
+        retrying while the new page is still loading.
 
         Returns:
-            str: The inferred status code.
+            str: The detected status, or None if the page never answered in time.
         """
-        try:
-            text = self.driver.find_element(By.TAG_NAME, "body").text.lower()
-            if "successfully redeemed" in text or "added to your account" in text:
-                return "SUCCESS"
-            if "already redeemed" in text or "already been used" in text:
-                return "ALREADY_USED"
-            if "code didn't work" in text or "invalid code" in text:
-                return "INVALID"
-            if "verify it's you" in text or "you must sign in" in text:
-                return "LOGIN_REQ"
-            return "UNKNOWN_ERROR"
-        except Exception:
-            return "ERROR"
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                return None
+
+            try:
+                response = self.driver.execute_cdp_cmd(
+                    "Runtime.evaluate",
+                    {
+                        "expression": f"({DETECT_STATUS_JS})({remaining_ms})",
+                        "awaitPromise": True,
+                        "returnByValue": True,
+                    },
+                )
+                status = response.get("result", {}).get("value")
+            except WebDriverException:
+                # The page navigated while the poll was running
+                status = None
+
+            if status and status != "STALE":
+                return status
+            time.sleep(STALE_RETRY_DELAY)
 
     def _manual_login(self):
         """
@@ -244,10 +333,7 @@ class AutoRedeemer:
         """
         result = self.redeem_code(code)
         print(f"FINAL RESULT: {result}")
-        # Driver is cleaned up by __del__ or manually
-        if self.driver:
-            self.driver.quit()
-            self.driver = None
+        # The browser stays open for the next code; see shutdown()
         return result
 
 
@@ -267,7 +353,11 @@ if __name__ == "__main__":
     # we can probably reduce this or remove it. Leaving 2s for stability.
     time.sleep(2)
 
-    start = time.perf_counter()
-    bot.redeem(code_to_check)
-    end = time.perf_counter()
-    print(f"Total Time: {end - start:.4f}s")
+    try:
+        start = time.perf_counter()
+        bot.redeem(code_to_check)
+        end = time.perf_counter()
+        print(f"Total Time: {end - start:.4f}s")
+    finally:
+        # The browser stays open after redeem(); close it before exiting
+        bot.shutdown()
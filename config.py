@@ -17,3 +17,6 @@ SESSION_NAME = "session1"
 # Set to a list of usernames/IDs to filter (e.g., [-100123456789, 'my_channel'])
 TARGET_CHATS = []
 
+# Debug: Save each OCR crop and print the raw OCR text.
+# Off by default (it writes a file for every image). Set OCR_DEBUG=1 to enable.
+OCR_DEBUG = os.getenv("OCR_DEBUG") == "1"
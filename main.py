@@ -2,14 +2,24 @@ import asyncio
 import sys
 import time
 import os
+
+# Keep each OCR thread single-threaded: parallelism comes from OCR_WORKERS.
+# Tesseract's OpenMP and OpenCV/OpenBLAS internal threads would otherwise
+# oversubscribe the cores shared with the Chrome bots.
+# Must be set before cv2/tesserocr are imported.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+
 import config
 from concurrent.futures import ThreadPoolExecutor
-from app.ocr import extract_redeem_code
+from app.ocr import HAS_TESSEROCR, extract_redeem_codes
 from app.telegram import TelegramListener
 from autoredeem.autoredeem import AutoRedeemer
 
 # Configuration for Parallelism
 NUM_BOTS = 3  # Number of parallel Chrome instances
+OCR_BATCH_SIZE = 8  # Max queued images OCR'd in one tesseract run (pytesseract fallback only)
+OCR_WORKERS = 2  # Number of images OCR'd in parallel (one single-threaded Tesseract engine each)
 
 
 class RedemptionPool:
@@ -20,13 +30,14 @@ class RedemptionPool:
     def __init__(self, size=3):
         self.size = size
         self.pool = asyncio.Queue()  # Stores available bot instances
-        self.executor = ThreadPoolExecutor(
-            max_workers=size
-        )  # For running blocking Selenium calls
+        self.bots = []  # Every bot created, including ones currently in use
+        # One dedicated thread per bot (by worker_id) for its blocking Selenium calls
+        self.bot_executors = {}
 
     def initialize_bots(self):
         """
         Creates the bot instances, each with a unique profile path.
+        Browsers are started in parallel, so startup takes about as long as one bot.
         """
         print(f"[POOL] Initializing {self.size} AutoRedeemer bots...")
 
@@ -34,16 +45,53 @@ class RedemptionPool:
         base_profile_dir = "chrome_profiles"
         os.makedirs(base_profile_dir, exist_ok=True)
 
-        for i in range(self.size):
-            profile_path = os.path.join(base_profile_dir, f"bot_{i + 1}")
-            # Initialize bot (headless=False for debugging, ideally True for prod)
-            bot = AutoRedeemer(
-                dry_run=False, headless=True, timeout=20, profile_path=profile_path
-            )
-            # Tag the bot with an ID
-            bot.worker_id = i + 1
-            self.pool.put_nowait(bot)
-            print(f"[POOL] Bot #{i + 1} Ready (Profile: {profile_path})")
+        first = 0
+        if not os.path.exists(AutoRedeemer.COOKIE_FILE):
+            # First run: one bot handles the manual login and saves the cookies
+            # before the others start (and load them)
+            self._register(self._spawn_one(0, base_profile_dir))
+            first = 1
+
+        # Register every bot that started, even if another one failed,
+        # so shutdown() can still close its browser
+        error = None
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            futures = [
+                executor.submit(self._spawn_one, i, base_profile_dir)
+                for i in range(first, self.size)
+            ]
+            for future in futures:
+                try:
+                    self._register(future.result())
+                except Exception as e:
+                    error = error or e
+
+        if error is not None:
+            raise error
+
+    def _register(self, bot):
+        """
+        Adds a started bot to the pool, with its own executor thread.
+        """
+        self.bot_executors[bot.worker_id] = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"bot{bot.worker_id}"
+        )
+        self.bots.append(bot)
+        self.pool.put_nowait(bot)
+
+    def _spawn_one(self, i, base_profile_dir):
+        """
+        Creates bot #i+1 with its own Chrome profile.
+        """
+        profile_path = os.path.join(base_profile_dir, f"bot_{i + 1}")
+        # Initialize bot (headless=False for debugging, ideally True for prod)
+        bot = AutoRedeemer(
+            dry_run=False, headless=True, timeout=20, profile_path=profile_path
+        )
+        # Tag the bot with an ID
+        bot.worker_id = i + 1
+        print(f"[POOL] Bot #{i + 1} Ready (Profile: {profile_path})")
+        return bot
 
     async def redeem_async(self, code):
         """
@@ -53,48 +101,82 @@ class RedemptionPool:
         bot = await self.pool.get()
 
         try:
-            # Run the blocking Selenium code in a separate thread
+            # Run the blocking Selenium code on the bot's own thread
             # This prevents freezing the main asyncio loop
             loop = asyncio.get_running_loop()
-            status = await loop.run_in_executor(self.executor, bot.redeem_code, code)
+            status = await loop.run_in_executor(
+                self.bot_executors[bot.worker_id], bot.redeem_code, code
+            )
 
             return status, bot.worker_id
         finally:
             # Always return the bot to the pool, even if it crashed
             self.pool.put_nowait(bot)
 
-
-async def ocr_worker(image_queue, code_queue):
+    def shutdown(self):
+        """
+        Drains the pool and closes every bot's browser.
+        """
+        print("[POOL] Closing bots...")
+        while not self.pool.empty():
+            self.pool.get_nowait()
+        for bot in self.bots:
+            bot.shutdown()
+        self.bots.clear()
+        for executor in self.bot_executors.values():
+            executor.shutdown(wait=False)
+        self.bot_executors.clear()
+
+
+async def ocr_worker(image_queue, code_queue, ocr_executor, worker_id=1):
     """
     Consumer 1: Pulls images, runs OCR (fast), pushes codes to code_queue.
+    OCR runs on ocr_executor so it doesn't block the asyncio loop.
     """
-    print("[OCR WORKER] Ready to process images.")
+    print(f"[OCR WORKER #{worker_id}] Ready to process images.")
+    loop = asyncio.get_running_loop()
 
-    while True:
-        item = await image_queue.get()
-        image_bytes = item["image"]
-        chat_title = item.get("chat_title", "Unknown")
-        arrival_time = item["timestamp"]
+    # With tesserocr, batching buys nothing (the engine is already loaded) and
+    # would keep images away from the other OCR workers.
+    max_batch = 1 if HAS_TESSEROCR else OCR_BATCH_SIZE
 
-        lag = time.time() - arrival_time
-        print(f"\n>>> [OCR] Scanning image from '{chat_title}' (Lag: {lag:.3f}s)")
+    while True:
+        # Take whatever else is already waiting (a burst of images) so it can
+        # be OCR'd together. A lone image is processed right away.
+        batch = [await image_queue.get()]
+        while len(batch) < max_batch:
+            try:
+                batch.append(image_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        for item in batch:
+            chat_title = item.get("chat_title", "Unknown")
+            lag = time.time() - item["timestamp"]
+            print(f"\n>>> [OCR] Scanning image from '{chat_title}' (Lag: {lag:.3f}s)")
 
         # OCR Extraction
         ocr_start = time.time()
-        code = extract_redeem_code(image_bytes, debug=True)
+        codes = await loop.run_in_executor(
+            ocr_executor,
+            extract_redeem_codes,
+            [item["image"] for item in batch],
+            config.OCR_DEBUG,
+        )
         ocr_duration = time.time() - ocr_start
 
-        if code:
-            print(f"✅ [OCR] FOUND CODE: {code} ({ocr_duration:.3f}s)")
-            # Push to the redemption queue
-            await code_queue.put(code)
-        else:
-            print(f"❌ [OCR] No code found ({ocr_duration:.3f}s)")
+        for code in codes:
+            if code:
+                print(f"✅ [OCR] FOUND CODE: {code} ({ocr_duration:.3f}s)")
+                # Push to the redemption queue
+                await code_queue.put(code)
+            else:
+                print(f"❌ [OCR] No code found ({ocr_duration:.3f}s)")
 
-        image_queue.task_done()
+            image_queue.task_done()
 
 
-async def redemption_manager(code_queue, bot_pool):
+async def redemption_manager(code_queue, bot_pool, log_queue):
     """
     Consumer 2: Pulls codes and schedules them on the bot pool.
     """
@@ -105,12 +187,12 @@ async def redemption_manager(code_queue, bot_pool):
 
         # Fire and forget (or rather, fire and await result asynchronously)
         # We wrap it in a task so we don't block waiting for this specific redemption
-        asyncio.create_task(handle_redemption(bot_pool, code))
+        asyncio.create_task(handle_redemption(bot_pool, code, log_queue))
 
         code_queue.task_done()
 
 
-async def handle_redemption(bot_pool, code):
+async def handle_redemption(bot_pool, code, log_queue):
     """
     Helper to run redemption and log the result.
     """
@@ -123,12 +205,26 @@ async def handle_redemption(bot_pool, code):
         f"🚀 [REDEEM FINISHED] Code: {code} | Status: {status} | Bot #{worker_id} | Time: {duration:.3f}s"
     )
 
-    # Log to file
-    with open("data/codes.txt", "a") as f:
-        f.write(f"{code} | {status} | {time.ctime()} | Bot #{worker_id}\n")
+    # Log to file (written by log_writer)
+    await log_queue.put(f"{code} | {status} | {time.ctime()} | Bot #{worker_id}\n")
 
 
-async def main():
+async def log_writer(log_queue, path="data/codes.txt"):
+    """
+    Consumer 3: Appends result lines to the log file.
+    Keeps a single file handle open and flushes once the queue is drained,
+    so bursts of results don't block the loop with repeated open/close.
+    """
+    with open(path, "a", buffering=64 * 1024) as f:
+        while True:
+            line = await log_queue.get()
+            f.write(line)
+            if log_queue.empty():
+                f.flush()
+            log_queue.task_done()
+
+
+async def main(bot_pool):
     # 1. Validation
     if config.API_ID == 12345678:
         print("CRITICAL: Please configure 'config.py' with your API credentials.")
@@ -137,12 +233,17 @@ async def main():
     # 2. Setup Queues
     image_queue = asyncio.Queue()  # Telegram -> OCR
     code_queue = asyncio.Queue()  # OCR -> Redeemer
+    log_queue = asyncio.Queue()  # Redeemer -> codes.txt
 
     # 3. Initialize Bot Pool
-    bot_pool = RedemptionPool(size=NUM_BOTS)
     bot_pool.initialize_bots()
 
-    # 4. Initialize Telegram Listener
+    # 4. OCR Thread Pool (each thread lazily creates its own Tesseract engine)
+    ocr_executor = ThreadPoolExecutor(
+        max_workers=OCR_WORKERS, thread_name_prefix="ocr"
+    )
+
+    # 5. Initialize Telegram Listener
     listener = TelegramListener(
         api_id=config.API_ID,
         api_hash=config.API_HASH,
@@ -151,12 +252,18 @@ async def main():
         target_chats=config.TARGET_CHATS,
     )
 
-    # 5. Launch Tasks
+    # 6. Launch Tasks
     tasks = [
         asyncio.create_task(listener.start()),
-        asyncio.create_task(ocr_worker(image_queue, code_queue)),
-        asyncio.create_task(redemption_manager(code_queue, bot_pool)),
+        asyncio.create_task(redemption_manager(code_queue, bot_pool, log_queue)),
+        asyncio.create_task(log_writer(log_queue)),
     ]
+    for i in range(OCR_WORKERS):
+        tasks.append(
+            asyncio.create_task(
+                ocr_worker(image_queue, code_queue, ocr_executor, worker_id=i + 1)
+            )
+        )
 
     print(f"=== Contest Bot Online (Parallel Mode: {NUM_BOTS} Bots) ===")
     print(f"Target Chats: {config.TARGET_CHATS if config.TARGET_CHATS else 'ALL'}")
@@ -167,13 +274,19 @@ async def main():
 
 
 if __name__ == "__main__":
+    bot_pool = None
     try:
         if sys.platform == "win32":
             asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        loop.run_until_complete(main())
+        bot_pool = RedemptionPool(size=NUM_BOTS)
+        loop.run_until_complete(main(bot_pool))
     except KeyboardInterrupt:
         print("\n[SYSTEM] Shutting down...")
+    finally:
+        # Browsers stay open between codes, so close them explicitly
+        if bot_pool:
+            bot_pool.shutdown()
 